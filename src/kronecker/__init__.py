@@ -2,7 +2,14 @@ from kronecker.api import *
 
 import kronecker.core as core
 import kronecker.backends as backends
+import kronecker.reductions as reductions
+from kronecker.cache import enable_cache, disable_cache
 
 # not sure how to handle the typechecking for this...
 core.Equation.to_numpy = backends.NumpyBackend.realise # type: ignore
 core.Equation.to_sparse = backends.ScipySparseBackend.realise # type: ignore
+core.Equation.sum = reductions.reduce_sum # type: ignore
+core.Equation.any = reductions.reduce_any # type: ignore
+core.Equation.all = reductions.reduce_all # type: ignore
+core.Equation.nonzero = reductions.iter_nonzero # type: ignore
+core.Equation.extend = extend # type: ignore
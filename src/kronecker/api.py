@@ -1,6 +1,12 @@
-from typing import Tuple
+from typing import Tuple, Any
 
-from kronecker.core import Index
+import numpy as np
+import scipy.sparse as sparse
+
+from kronecker.core import Index, Equation
+from kronecker.backends import NumpyBackend, ScipySparseBackend
+
+__all__ = ["indices", "extend"]
 
 def indices(*shape: int) -> Tuple[Index,...]:
     """Create Index objects for tensor of the given shape.
@@ -26,4 +32,34 @@ def indices(*shape: int) -> Tuple[Index,...]:
     idxs = tuple(Index(n) for n in shape)
     for idx in idxs:
         idx.indices = idxs
-    return idxs
\ No newline at end of file
+    return idxs
+
+
+def extend(eq: Equation, existing: Any, *shape: int) -> Any:
+    """Grow existing, the result of eq.to_numpy() or eq.to_sparse() (or a previous extend),
+    to the given larger shape, only computing the new entries. E.g.
+
+    i, j = kronecker.indices(1000, 1000)
+    eq = i >= j
+    mat = eq.to_sparse()
+    mat = eq.extend(mat, 1100, 1000)  # only creates the 100 new rows
+
+
+    Parameters
+    ----------
+    eq
+        equation existing was realised from
+    existing
+        numpy array or scipy sparse matrix
+    shape
+        n_dim integers giving the new tensor shape
+
+    Returns
+    -------
+        numpy array or scipy sparse matrix (in csr format), same as existing
+    """
+    if isinstance(existing, np.ndarray):
+        return NumpyBackend.extend(eq, existing, shape)
+    elif sparse.issparse(existing):
+        return ScipySparseBackend.extend(eq, existing, shape)
+    raise TypeError(f"Can't extend {type(existing)}, expected numpy array or scipy sparse matrix!")
\ No newline at end of file
@@ -1,9 +1,13 @@
 import abc
-from typing import Any
+from typing import Any, Tuple
 
 from kronecker.core import Equation
 
 class Backend(abc.ABC):
     @abc.abstractmethod
     def realise(self, eq: Equation) -> Any:
+        pass
+
+    @abc.abstractmethod
+    def extend(self, eq: Equation, existing: Any, shape: Tuple[int, ...]) -> Any:
         pass
\ No newline at end of file
@@ -1,12 +1,19 @@
-from typing import Tuple, Sequence, Dict, Union
+from typing import Tuple, Sequence, Dict, Union, Optional, Iterator
 from numbers import Real
+from math import ceil
+from concurrent.futures import ThreadPoolExecutor
 
-from kronecker.core import Index, Equation, Term, CompositeTerm, RealTerm
+from kronecker.core import Index, Equation, Term, RealTerm, fold_term, to_postfix
 from kronecker.backends.base import Backend
+import kronecker.cache as cache
 
 import numpy as np
 
-        
+
+# maximum number of entries evaluated at once when working tile by tile
+DEFAULT_TILE_SIZE = 2 ** 22
+
+
 def create_index_array(shape: Tuple[int,...], index_dim: int) -> np.ndarray:
     initial_shape = np.ones(len(shape), dtype=np.int32)
     initial_shape[index_dim] = shape[index_dim]
@@ -14,41 +21,203 @@ def create_index_array(shape: Tuple[int,...], index_dim: int) -> np.ndarray:
     return np.tile(idxs, tuple(1 if i == index_dim else s for i, s in enumerate(shape)))
 
 
-def create_index_arrays(indices: Sequence[Index]) -> Dict[Index, np.ndarray]:
-    shape = tuple(idx.n for idx in indices)
-    return {idx: create_index_array(shape, i) for i, idx in enumerate(indices)}
+def create_index_arrays(
+    indices: Sequence[Index],
+    ranges: Optional[Sequence[range]] = None
+    ) -> Dict[Index, np.ndarray]:
+    if ranges is None:
+        shape = tuple(idx.n for idx in indices)
+        return {idx: create_index_array(shape, i) for i, idx in enumerate(indices)}
+
+    # only create the box ranges[0] x ranges[1] x ...
+    shape = tuple(len(r) for r in ranges)
+    return {idx: create_index_array(shape, i) + r.start for i, (idx, r) in enumerate(zip(indices, ranges))}
+
+
+def iter_tiles(shape: Tuple[int, ...], tile_size: int = DEFAULT_TILE_SIZE) -> Iterator[range]:
+    """Split the leading axis of shape into ranges, such that each tile
+    contains at most tile_size entries (but always at least one row).
+
+    Parameters
+    ----------
+    shape
+        shape of the full tensor
+    tile_size
+        maximum number of entries per tile
+
+    Returns
+    -------
+        Iterator over ranges of the leading axis.
+    """
+    row_size = int(np.prod(shape[1:], dtype=np.int64))
+    rows_per_tile = max(1, tile_size // max(1, row_size))
+    for start in range(0, shape[0], rows_per_tile):
+        yield range(start, min(start + rows_per_tile, shape[0]))
 
     
 def realise_term(
     term: Term,
     index_values: Dict[Index, np.ndarray]
     ) -> Union[np.ndarray, Real]:
-    if isinstance(term, RealTerm):
-        return term.value
-    elif isinstance(term, Index):
-        return index_values[term]
-    elif isinstance(term, CompositeTerm):
-        return term.operator.value(
-            realise_term(term.left, index_values),
-            realise_term(term.right, index_values))
-    raise ValueError(f"Numpy backend can't realise term {term}")
+    def leaf(term: Term) -> Union[np.ndarray, Real]:
+        if isinstance(term, RealTerm):
+            return term.value
+        elif isinstance(term, Index):
+            return index_values[term]
+        raise ValueError(f"Numpy backend can't realise term {term}")
+
+    return fold_term(term, leaf, lambda term, left, right: term.operator.value(left, right))
+
+
+def realise_box(eq: Equation, ranges: Sequence[range]) -> np.ndarray:
+    """Create the box ranges[0] x ranges[1] x ... of the tensor represented by eq.
+    The ranges may extend beyond eq.shape.
+
+    Parameters
+    ----------
+    eq
+        equation to realise
+    ranges
+        one range of index values for each dimension
+
+    Returns
+    -------
+        boolean numpy array of shape (len(ranges[0]), len(ranges[1]), ...)
+    """
+    index_values = create_index_arrays(eq.indices, ranges)
+    return eq.operator.value(
+        realise_term(eq.left, index_values),
+        realise_term(eq.right, index_values))
+
+
+def realise_tile(eq: Equation, leading: range) -> np.ndarray:
+    """Create the slice leading.start <= eq.indices[0] < leading.stop
+    of the tensor represented by eq.
+
+    Parameters
+    ----------
+    eq
+        equation to realise
+    leading
+        range of the leading axis to realise
+
+    Returns
+    -------
+        boolean numpy array of shape (len(leading), *eq.shape[1:])
+    """
+    return realise_box(eq, (leading,) + tuple(range(n) for n in eq.shape[1:]))
+
+
+def realise_threaded(eq: Equation, threads: int) -> np.ndarray:
+    """Create the tensor represented by eq tile by tile on a pool of threads.
+    There are at least as many tiles as threads, and each has at most DEFAULT_TILE_SIZE entries.
+
+    Parameters
+    ----------
+    eq
+        equation to realise
+    threads
+        number of threads to use
+
+    Returns
+    -------
+        boolean numpy array
+    """
+    res = np.empty(eq.shape, dtype=bool)
+    # build the (cached) postfix programs up front, instead of once per thread
+    to_postfix(eq.left)
+    to_postfix(eq.right)
+
+    def realise_into(tile: range) -> None:
+        res[tile.start:tile.stop] = realise_tile(eq, tile)
+
+    tile_size = min(DEFAULT_TILE_SIZE, ceil(res.size / threads))
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        # list() re-raises any exception from the workers
+        list(pool.map(realise_into, iter_tiles(eq.shape, tile_size)))
+    return res
 
 
 class NumpyBackend(Backend):
+    # number of threads used by realise if none are given, set this to change the global default
+    threads: int = 1
+
     @staticmethod
-    def realise(eq: Equation) -> np.ndarray:
+    def realise(eq: Equation, threads: Optional[int] = None) -> np.ndarray:
         """Create the matrix represented by eq as a numpy matrix.
+        With more than one thread the leading axis is split into tiles, which are
+        evaluated concurrently (numpy releases the GIL for most operations)
+        and written into disjoint slices of the output.
+        If the disk cache is enabled (see kronecker.enable_cache) the result is
+        loaded from / stored in it.
 
         Parameters
         ----------
         eq
             equation to realise
+        threads
+            number of threads to use, defaults to NumpyBackend.threads
 
         Returns
         -------
             boolean numpy array
         """
-        index_values = create_index_arrays(eq.indices)
-        return eq.operator.value(
-            realise_term(eq.left, index_values),
-            realise_term(eq.right, index_values))
+        if threads is None:
+            threads = NumpyBackend.threads
+        if threads < 1:
+            raise ValueError(f"threads must be at least 1, got {threads}")
+
+        disk_cache = cache.active_cache
+        if disk_cache is not None:
+            cached = disk_cache.load(eq, "numpy", ("array",))
+            if cached is not None:
+                return cached["array"]
+
+        if threads > 1 and eq.shape[0] > 1:
+            res = realise_threaded(eq, threads)
+        else:
+            index_values = create_index_arrays(eq.indices)
+            res = eq.operator.value(
+                realise_term(eq.left, index_values),
+                realise_term(eq.right, index_values))
+
+        if disk_cache is not None:
+            disk_cache.store(eq, "numpy", {"array": res})
+        return res
+
+    @staticmethod
+    def extend(eq: Equation, existing: np.ndarray, shape: Tuple[int, ...]) -> np.ndarray:
+        """Grow existing, the tensor represented by eq realised at a smaller shape, to shape.
+        Only the new entries are created, the existing ones are copied exactly once.
+        The shape of eq itself is not changed.
+
+        Parameters
+        ----------
+        eq
+            equation existing was realised from
+        existing
+            boolean numpy array, e.g. the result of eq.to_numpy()
+        shape
+            new shape, at least as large as existing.shape along each dimension
+
+        Returns
+        -------
+            boolean numpy array
+        """
+        if len(shape) != len(eq.shape) or existing.ndim != len(eq.shape):
+            raise ValueError(f"Dimension mismatch: {existing.shape}, {shape}, expected {len(eq.shape)} dimensions")
+        elif any(n < old_n for n, old_n in zip(shape, existing.shape)):
+            raise ValueError(f"Can't extend array of shape {existing.shape} to smaller shape {shape}!")
+
+        res = np.empty(shape, dtype=bool)
+        res[tuple(slice(0, n) for n in existing.shape)] = existing
+        # the new entries are split into disjoint boxes, one for each grown dimension d,
+        # containing the new values along d, the old ones before d and all after d
+        for d, (old_n, n) in enumerate(zip(existing.shape, shape)):
+            if n == old_n:
+                continue
+            ranges = (tuple(range(k) for k in existing.shape[:d])
+                      + (range(old_n, n),)
+                      + tuple(range(k) for k in shape[d + 1:]))
+            res[tuple(slice(r.start, r.stop) for r in ranges)] = realise_box(eq, ranges)
+        return res
\ No newline at end of file
@@ -1,15 +1,18 @@
 from typing import cast, Union, Dict, Optional, Literal, Tuple, List, Callable
 from numbers import Real
-from math import ceil
+from math import ceil, floor
 from itertools import chain
 from collections import defaultdict
 import ast
 import warnings
+import weakref
 
+import numpy as np
 import scipy.sparse as sparse
 
 from kronecker.backends.base import Backend
-from kronecker.core import Equation, Term, RealTerm, CompositeTerm, Index
+import kronecker.cache as cache
+from kronecker.core import Equation, Term, RealTerm, CompositeTerm, Index, fold_term, to_postfix
 from kronecker.primitives import BinaryOperator, ComparisonOperator
 
 
@@ -21,6 +24,11 @@ class NonLinearError(NotImplementedError):
     pass
 
 
+# row build functions only depend on the equation (cols can be passed in when calling them),
+# so they can be reused when the same equation is realised or extended again
+BUILD_FUN_CACHE: "weakref.WeakKeyDictionary[Equation, RowBuildFun]" = weakref.WeakKeyDictionary()
+
+
 INVERSE_OPERATOR = {
     ComparisonOperator.EQ: ComparisonOperator.EQ,
     ComparisonOperator.NE: ComparisonOperator.NE,
@@ -39,6 +47,9 @@ AST_COMPARISON_OP = {
     ComparisonOperator.LE: ast.LtE
 }
 
+# nesting depth at which subexpressions are assigned to variables when compiling equations
+MAX_AST_DEPTH = 100
+
 AST_BINARY_OP = {
     BinaryOperator.ADD: ast.Add,
     BinaryOperator.SUB: ast.Sub,
@@ -65,19 +76,22 @@ def get_linear_coefficients(
         Mapping from index to coefficient, None represents constant term.
     """
 
-    if isinstance(term, RealTerm):
-        return cast(LinearIndexExpression, defaultdict(int, {None: term.value}))
-    elif isinstance(term, Index):
-        return cast(LinearIndexExpression, defaultdict(int, {term: 1, None: 0}))
-    elif isinstance(term, CompositeTerm):
-        if term.operator is BinaryOperator.POW:
-            raise NonLinearError()
-
-        left = get_linear_coefficients(term.left)
-        right = get_linear_coefficients(term.right)
+    def leaf(term: Term) -> LinearIndexExpression:
+        if isinstance(term, RealTerm):
+            return cast(LinearIndexExpression, defaultdict(int, {None: term.value}))
+        elif isinstance(term, Index):
+            return cast(LinearIndexExpression, defaultdict(int, {term: 1, None: 0}))
+        raise ValueError(f"Numpy backend can't realise term {term}")
+
+    def combine(
+        term: CompositeTerm,
+        left: LinearIndexExpression,
+        right: LinearIndexExpression
+        ) -> LinearIndexExpression:
+        # shared subtrees are only evaluated once, so don't insert into left / right
         combined_keys = set(left) | set(right)
         if term.operator in (BinaryOperator.ADD, BinaryOperator.SUB):
-            return cast(LinearIndexExpression, defaultdict(int, {k: term.operator.value(left[k], right[k]) for k in combined_keys}))
+            return cast(LinearIndexExpression, defaultdict(int, {k: term.operator.value(left.get(k, 0), right.get(k, 0)) for k in combined_keys}))
         elif term.operator in (BinaryOperator.MUL, BinaryOperator.TRUEDIV):
             factor: float
             if list(left) == [None]:
@@ -95,7 +109,45 @@ def get_linear_coefficients(
         else:
             raise NotImplementedError(f"Operator {term.operator} is not supported by scipy.sparse backend!")
 
-    raise ValueError(f"Numpy backend can't realise term {term}")
+    return fold_term(term, leaf, combine)
+
+
+def get_linear_form(
+    eq: Equation,
+    row_index: Index,
+    col_index: Index
+    ) -> Tuple[ComparisonOperator, float, float]:
+    """Put the linear equation eq into the form
+        col_index {operator} {a} * row_index + {b}
+    Raises NonLinearError if eq is not linear in the indices, or if
+    the coefficient of col_index vanishes.
+
+    Parameters
+    ----------
+    eq
+    row_index
+        Index object that specifies the row location.
+    col_index
+        Index object that is solved for.
+
+    Returns
+    -------
+        Tuple of (operator, a, b).
+    """
+    left = get_linear_coefficients(eq.left)
+    right = get_linear_coefficients(eq.right)
+
+    col_mult = left[col_index] - right[col_index]
+    if col_mult == 0:
+        raise NonLinearError()
+    elif col_mult > 0:
+        operator = eq.operator
+    else:
+        # flip the comparison operator if we divide by a negative value
+        operator = INVERSE_OPERATOR[eq.operator]
+    a = (right[row_index] - left[row_index]) / col_mult
+    b = (right[None] - left[None]) / col_mult
+    return operator, a, b
 
 
 def get_linear_build_fun(
@@ -105,7 +157,8 @@ def get_linear_build_fun(
     ) -> RowBuildFun:
     """Get a function to create each row of the (rows, cols) matrix described by the equation
         col_index {operator} {a} * row_index + {b}
-    when given row ∈ [0, rows)
+    when given row ∈ [0, rows). The returned function optionally takes cols and col_start
+    to only create the columns col_start <= col < cols.
 
     Parameters
     ----------
@@ -123,35 +176,43 @@ def get_linear_build_fun(
         Function mapping from row index to row of the matrix.
     """
     if operator is ComparisonOperator.EQ:
-        return lambda row, cols=cols, a=a, b=b: ([x], [True]) if 0 <= (x := a * row + b) < cols and (isinstance(x, int) or x.is_integer()) else ([], [])
+        return lambda row, cols=cols, col_start=0, a=a, b=b: ([int(x)], [True]) if col_start <= (x := a * row + b) < cols and (isinstance(x, int) or x.is_integer()) else ([], [])
     elif operator is ComparisonOperator.NE:
-        return lambda row, cols=cols, a=a, b=b: (
-            (list(chain(range(int(x)), range(int(x) + 1, cols))),
-                [True] * (cols - 1))
-            if isinstance(x := a * row + b, int) or x.is_integer()
-            else (list(range(cols)), [True] * cols))
+        return lambda row, cols=cols, col_start=0, a=a, b=b: (
+            (idx := (list(chain(range(col_start, max(col_start, min(int(x), cols))),
+                                range(max(col_start, int(x) + 1), cols)))
+                     if isinstance(x := a * row + b, int) or x.is_integer()
+                     else list(range(col_start, cols)))),
+            [True] * len(idx))
     elif operator is ComparisonOperator.GT:
-        return lambda row, cols=cols, a=a, b=b: (list(range(x := max(0, int(a * row + b + 1)), cols)),
+        return lambda row, cols=cols, col_start=0, a=a, b=b: (list(range(x := max(col_start, floor(a * row + b) + 1), cols)),
                             [True] * max(0, cols - x))
     elif operator is ComparisonOperator.GE:
-        return lambda row, cols=cols, a=a, b=b: (list(range(x := max(0, int(ceil(a * row + b))), cols)),
+        return lambda row, cols=cols, col_start=0, a=a, b=b: (list(range(x := max(col_start, ceil(a * row + b)), cols)),
                             [True] * max(0, cols - x))
     elif operator is ComparisonOperator.LT:
-        return lambda row, cols=cols, a=a, b=b: (list(range(x := min(int(ceil(a * row + b)), cols))),
-                            [True] * max(0, x))
+        return lambda row, cols=cols, col_start=0, a=a, b=b: (list(range(col_start, (x := min(ceil(a * row + b), cols)))),
+                            [True] * max(0, x - col_start))
     elif operator is ComparisonOperator.LE:
-        return lambda row, cols=cols, a=a, b=b: (list(range(x := min(int(a * row + b) + 1, cols))),
-                            [True] * max(0, x))
+        return lambda row, cols=cols, col_start=0, a=a, b=b: (list(range(col_start, (x := min(floor(a * row + b) + 1, cols)))),
+                            [True] * max(0, x - col_start))
     else:
         raise NotImplementedError(f"Operator {operator} is not supported!")
 
 
-def term_to_ast(term: Term, row_index: Index, col_index: Index) -> ast.expr:
-    """Convert the given term to an ast expression
+def terms_to_ast(
+    terms: Tuple[Term, ...],
+    row_index: Index,
+    col_index: Index
+    ) -> Tuple[List[ast.stmt], List[ast.expr]]:
+    """Convert the given terms to ast expressions. Subterms that are used more than once
+    or that are nested too deeply (compile recurses over nested expressions) are assigned
+    to variables first, so shared subterms are only evaluated once and arbitrarily deep terms
+    can be compiled.
 
     Parameters
     ----------
-    term
+    terms
     row_index
         Index object that specifies the row location.
     col_index
@@ -159,27 +220,55 @@ def term_to_ast(term: Term, row_index: Index, col_index: Index) -> ast.expr:
 
     Returns
     -------
-        Ast version of term, with row_index replaced by "row" variable
-        and col_index replaced by "col" variable.
+        Tuple of (list of assignments, ast version of each term), with row_index replaced by "row"
+        variable and col_index replaced by "col" variable.
     """
-    if isinstance(term, RealTerm):
-        return ast.Constant(term.value)
-    elif isinstance(term, Index):
-        if term is row_index:
-            return ast.Name("row", ctx=ast.Load())
-        elif term is col_index:
-            return ast.Name("col", ctx=ast.Load())
-        else:
-            raise ValueError(f"Unidentified index {term}, expected row or column index!")
-    elif isinstance(term, CompositeTerm):
-        return ast.BinOp(
-            term_to_ast(term.left, row_index, col_index),
-            AST_BINARY_OP[term.operator](),
-            term_to_ast(term.right, row_index, col_index)
-            )
-    else:
+    postfixes = [to_postfix(term) for term in terms]
+    uses: Dict[int, int] = defaultdict(int)
+    counted = set()
+    for node, _, _ in chain.from_iterable(postfixes):
+        if isinstance(node, CompositeTerm) and id(node) not in counted:
+            counted.add(id(node))
+            uses[id(node.left)] += 1
+            uses[id(node.right)] += 1
+    for term in terms:
+        uses[id(term)] += 1
+
+    names: Dict[int, str] = {}
+    # expression and nesting depth of the composite subterms that are used once
+    inlined: Dict[int, Tuple[ast.expr, int]] = {}
+    assignments: List[ast.stmt] = []
+
+    def operand(term: Term) -> Tuple[ast.expr, int]:
+        if isinstance(term, CompositeTerm):
+            if id(term) in names:
+                return ast.Name(names[id(term)], ctx=ast.Load()), 1
+            return inlined.pop(id(term))
+        elif isinstance(term, RealTerm):
+            return ast.Constant(term.value), 1
+        elif isinstance(term, Index):
+            if term is row_index:
+                return ast.Name("row", ctx=ast.Load()), 1
+            elif term is col_index:
+                return ast.Name("col", ctx=ast.Load()), 1
+            else:
+                raise ValueError(f"Unidentified index {term}, expected row or column index!")
         raise NotImplementedError(f"Unsupported term: {term}")
 
+    for node, _, _ in chain.from_iterable(postfixes):
+        if not isinstance(node, CompositeTerm) or id(node) in names or id(node) in inlined:
+            continue
+        left, left_depth = operand(node.left)
+        right, right_depth = operand(node.right)
+        expr = ast.BinOp(left, AST_BINARY_OP[node.operator](), right)
+        depth = max(left_depth, right_depth) + 1
+        if uses[id(node)] > 1 or depth >= MAX_AST_DEPTH:
+            names[id(node)] = f"v{len(assignments)}"
+            assignments.append(ast.Assign([ast.Name(names[id(node)], ctx=ast.Store())], expr))
+        else:
+            inlined[id(node)] = (expr, depth)
+    return assignments, [operand(term)[0] for term in terms]
+
 
 def get_non_linear_build_fun(eq: Equation, row_index: Index, col_index: Index) -> RowBuildFun:
     """Get a function to create each row of the (rows, cols) matrix described by the equation eq
@@ -199,24 +288,28 @@ def get_non_linear_build_fun(eq: Equation, row_index: Index, col_index: Index) -
     """
     # we don't want to have a bunch of nested function calls for each entry,
     # so flatten it out by creating an AST for the whole expression
-    # and then compiling it into a single lambda
-    ast_left = term_to_ast(eq.left, row_index, col_index)
-    ast_right = term_to_ast(eq.right, row_index, col_index)
-    ast_bool_fun = ast.fix_missing_locations(ast.Expression(
-        ast.Lambda(
-            ast.arguments(posonlyargs=[], args=[ast.arg(arg="row"), ast.arg(arg="col")],
-                          kwonlyargs=[], kw_defaults=[], defaults=[]),
-            ast.Compare(ast_left, [AST_COMPARISON_OP[eq.operator]()], [ast_right])
-        )
-    ))
-    ast_lambda = eval(compile(ast_bool_fun, filename="<built_expr>", mode="eval"))
+    # and then compiling it into a single function
+    assignments, (ast_left, ast_right) = terms_to_ast((eq.left, eq.right), row_index, col_index)
+    ast_module = ast.fix_missing_locations(ast.Module(
+        body=[ast.FunctionDef(
+            name="bool_fun",
+            args=ast.arguments(posonlyargs=[], args=[ast.arg(arg="row"), ast.arg(arg="col")],
+                               kwonlyargs=[], kw_defaults=[], defaults=[]),
+            body=[*assignments, ast.Return(
+                ast.Compare(ast_left, [AST_COMPARISON_OP[eq.operator]()], [ast_right]))],
+            decorator_list=[])],
+        type_ignores=[]))
+    namespace: Dict[str, Callable[[int, int], bool]] = {}
+    exec(compile(ast_module, filename="<built_expr>", mode="exec"), namespace)
+    ast_fun = namespace["bool_fun"]
     def build_fun(
         row: int,
         cols: int=eq.shape[1],
-        ast_lambda: Callable[[int, int], bool]=ast_lambda
+        col_start: int=0,
+        ast_fun: Callable[[int, int], bool]=ast_fun
         ) -> Tuple[List[int], List[Literal[True]]]:
         
-        non_zero_indices = [col for col in range(cols) if ast_lambda(row, col)]
+        non_zero_indices = [col for col in range(col_start, cols) if ast_fun(row, col)]
         return non_zero_indices, [True] * len(non_zero_indices)
 
     return build_fun
@@ -225,7 +318,7 @@ def get_non_linear_build_fun(eq: Equation, row_index: Index, col_index: Index) -
 def get_build_fun(eq: Equation) -> RowBuildFun:
     """Get a function to create each row of the (rows, cols) matrix described by the equation eq
     when given row ∈ [0, rows). Uses fast approach for linear equations and slower one
-    for non-linear ones.
+    for non-linear ones. The function is cached, so repeated calls for the same eq are free.
 
     Parameters
     ----------
@@ -235,12 +328,14 @@ def get_build_fun(eq: Equation) -> RowBuildFun:
     -------
         Function mapping from row index to (list of non-zero indices, list of values).
     """
+    if eq in BUILD_FUN_CACHE:
+        return BUILD_FUN_CACHE[eq]
+
     row_index, col_index = eq.indices
     rows, cols = eq.shape
 
     try:
-        left = get_linear_coefficients(eq.left)
-        right = get_linear_coefficients(eq.right)
+        operator, a, b = get_linear_form(eq, row_index, col_index)
     except NonLinearError:
         warnings.warn(
             "Using slow path, this could take a long time for big matrices!"
@@ -248,18 +343,8 @@ def get_build_fun(eq: Equation) -> RowBuildFun:
             RuntimeWarning)
         build_fun = get_non_linear_build_fun(eq, row_index, col_index)
     else:
-        # we have a linear equation, put it into the form
-        # col = a * row + b
-        col_mult = left[col_index] - right[col_index]
-        if col_mult > 0:
-            operator = eq.operator
-        else:
-            # flip the comparison operator if we divide by a negative value
-            operator = INVERSE_OPERATOR[eq.operator]
-        a = (right[row_index] - left[row_index]) / col_mult
-        b = (right[None] - left[None]) / col_mult
-
         build_fun = get_linear_build_fun(operator=operator, a=a, b=b, cols=cols)
+    BUILD_FUN_CACHE[eq] = build_fun
     return build_fun
 
 
@@ -270,6 +355,8 @@ class ScipySparseBackend(Backend):
         If eq is purely linear in the indices the equation is simplified
         and execution time is O(n_rows * n_non_zero_entries). Else every
         entry has to be checked separately, i.e. it's O(n_rows * n_cols). 
+        If the disk cache is enabled (see kronecker.enable_cache) the result is
+        loaded from / stored in it.
 
         Parameters
         ----------
@@ -283,6 +370,13 @@ class ScipySparseBackend(Backend):
         if len(eq.shape) != 2:
             raise ValueError("Scipy.sparse only supports 2 dimensional matrices!")
 
+        disk_cache = cache.active_cache
+        if disk_cache is not None:
+            cached = disk_cache.load(eq, "sparse", ("data", "indices", "indptr"))
+            if cached is not None:
+                return sparse.csr_matrix(
+                    (cached["data"], cached["indices"], cached["indptr"]), shape=eq.shape, copy=False)
+
         rows, cols = eq.shape
 
         row_build_fun = get_build_fun(eq)
@@ -293,4 +387,74 @@ class ScipySparseBackend(Backend):
             lilmatrix.rows[i] = row_indices
             lilmatrix.data[i] = row_data
 
-        return lilmatrix.tocsr()
+        res = lilmatrix.tocsr()
+        if disk_cache is not None:
+            disk_cache.store(eq, "sparse", {"data": res.data, "indices": res.indices, "indptr": res.indptr})
+        return res
+
+    @staticmethod
+    def extend(eq: Equation, existing: sparse.spmatrix, shape: Tuple[int, ...]) -> sparse.csr_matrix:
+        """Grow existing, the matrix represented by eq realised at a smaller shape, to shape.
+        Only the new columns of the existing rows and the new rows are created (reusing the
+        cached row build function of eq), the existing entries are copied exactly once.
+        The shape of eq itself is not changed.
+
+        Parameters
+        ----------
+        eq
+            equation existing was realised from
+        existing
+            scipy sparse matrix, e.g. the result of eq.to_sparse()
+        shape
+            new shape, at least as large as existing.shape along each dimension
+
+        Returns
+        -------
+            scipy sparse matrix in csr format
+        """
+        if len(eq.shape) != 2 or len(shape) != 2:
+            raise ValueError("Scipy.sparse only supports 2 dimensional matrices!")
+
+        old_rows, old_cols = existing.shape
+        rows, cols = shape
+        if rows < old_rows or cols < old_cols:
+            raise ValueError(f"Can't extend matrix of shape {existing.shape} to smaller shape {shape}!")
+
+        # no copy if existing is already in csr format
+        existing = sparse.csr_matrix(existing)
+        row_build_fun = get_build_fun(eq)
+
+        new_row_indices = [row_build_fun(i, cols=cols)[0] for i in range(old_rows, rows)]
+        new_row_lengths = np.array([len(idx) for idx in new_row_indices], dtype=np.int64)
+
+        old_indptr = existing.indptr.astype(np.int64, copy=False)
+        indptr = np.empty(rows + 1, dtype=np.int64)
+        if cols > old_cols:
+            new_col_indices = [row_build_fun(i, cols=cols, col_start=old_cols)[0] for i in range(old_rows)]
+            new_col_lengths = np.array([len(idx) for idx in new_col_indices], dtype=np.int64)
+            indptr[0] = 0
+            np.cumsum(np.diff(old_indptr) + new_col_lengths, out=indptr[1:old_rows + 1])
+        else:
+            # only rows are added, the existing ones are unchanged
+            indptr[:old_rows + 1] = old_indptr
+        np.cumsum(new_row_lengths, out=indptr[old_rows + 1:])
+        indptr[old_rows + 1:] += indptr[old_rows]
+
+        index_dtype = np.int32 if max(indptr[-1], cols) < np.iinfo(np.int32).max else np.int64
+        indices = np.empty(indptr[-1], dtype=index_dtype)
+        if cols > old_cols:
+            # existing entries of each row stay in front, followed by the ones in the new columns
+            old_lengths = np.diff(old_indptr)
+            row_offsets = indptr[:old_rows] - old_indptr[:-1]
+            indices[np.arange(old_indptr[-1]) + np.repeat(row_offsets, old_lengths)] = existing.indices[:old_indptr[-1]]
+            new_col_offsets = indptr[:old_rows] + old_lengths - (np.cumsum(new_col_lengths) - new_col_lengths)
+            indices[np.arange(new_col_lengths.sum()) + np.repeat(new_col_offsets, new_col_lengths)] = np.fromiter(
+                chain.from_iterable(new_col_indices), dtype=index_dtype, count=new_col_lengths.sum())
+        else:
+            indices[:old_indptr[-1]] = existing.indices[:old_indptr[-1]]
+        indices[indptr[old_rows]:] = np.fromiter(
+            chain.from_iterable(new_row_indices), dtype=index_dtype, count=new_row_lengths.sum())
+
+        return sparse.csr_matrix(
+            (np.ones(len(indices), dtype=bool), indices, indptr.astype(index_dtype, copy=False)),
+            shape=(rows, cols))
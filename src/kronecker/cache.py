@@ -0,0 +1,181 @@
+from typing import Dict, Optional, List, Tuple, Union
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from kronecker.core import Equation, Term, RealTerm, CompositeTerm, Index, to_postfix
+
+
+# bump this if the fingerprint or the stored format change
+CACHE_VERSION = 1
+
+
+class DiskCache:
+    """Persistent cache of realised equations, stored as .npy files in directory.
+    Each entry is a subdirectory named after the fingerprint of the equation,
+    containing one .npy file per array. Entries are loaded as copy-on-write memmaps,
+    so a hit doesn't read the data up front and modifying the result doesn't change the cache.
+    Once the total size exceeds max_bytes the least recently used entries are removed.
+    """
+    def __init__(self, directory: Union[str, os.PathLike], max_bytes: int):
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def entry_path(self, eq: Equation, kind: str) -> str:
+        return os.path.join(self.directory, f"{fingerprint(eq)}-{kind}")
+
+    def load(self, eq: Equation, kind: str, names: Tuple[str, ...]) -> Optional[Dict[str, np.ndarray]]:
+        """Load the arrays stored for eq, None if there is no entry.
+
+        Parameters
+        ----------
+        eq
+            equation the arrays were created from
+        kind
+            type of result, e.g. "numpy" or "sparse"
+        names
+            names of the stored arrays
+
+        Returns
+        -------
+            Mapping from name to (memory mapped) array, None if there is no usable entry.
+        """
+        path = self.entry_path(eq, kind)
+        try:
+            arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="c") for name in names}
+            # mark as recently used
+            os.utime(path)
+        except ValueError:
+            # corrupted, remove it so it's stored again
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        except OSError:
+            # missing, evicted concurrently or not accessible (e.g. no permission)
+            return None
+        return arrays
+
+    def store(self, eq: Equation, kind: str, arrays: Dict[str, np.ndarray]) -> None:
+        """Store the arrays created from eq and evict old entries if the cache is full.
+        Arrays that are bigger than the whole cache are not stored.
+
+        Parameters
+        ----------
+        eq
+            equation the arrays were created from
+        kind
+            type of result, e.g. "numpy" or "sparse"
+        arrays
+            mapping from name to array
+        """
+        if sum(arr.nbytes for arr in arrays.values()) > self.max_bytes:
+            # it would only evict everything else and then itself
+            return
+        path = self.entry_path(eq, kind)
+        # write to a temporary directory first, so other processes never see partial entries
+        tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            for name, arr in arrays.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"), arr)
+            os.rename(tmp_path, path)
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self.evict()
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        """Get (last use time, size in bytes, path) of all entries."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(".tmp-") or not entry.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                entries.append((entry.stat().st_mtime, size, entry.path))
+            except FileNotFoundError:
+                continue
+        return entries
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache is at most max_bytes."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        for _, _, path in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# cache used by the backends, None if caching is disabled
+active_cache: Optional[DiskCache] = None
+
+
+def enable_cache(directory: Union[str, os.PathLike], max_bytes: int = 2 ** 30) -> DiskCache:
+    """Cache the results of Equation.to_numpy() and Equation.to_sparse() on disk,
+    so realising the same equation again (e.g. in a new process) only opens a memmap.
+
+    Parameters
+    ----------
+    directory
+        directory to store the cache in, created if it doesn't exist
+    max_bytes
+        maximum total size of the cache, least recently used entries are removed beyond that
+
+    Returns
+    -------
+        the new cache
+    """
+    global active_cache
+    active_cache = DiskCache(directory, max_bytes)
+    return active_cache
+
+
+def disable_cache() -> None:
+    """Stop using the disk cache (the stored entries are kept)."""
+    global active_cache
+    active_cache = None
+
+
+def term_fingerprint(term: Term, indices: Tuple[Index, ...]) -> List[str]:
+    """Encode the postfix program of term as strings that are stable across processes."""
+    encoded = []
+    for node, left, right in to_postfix(term):
+        if isinstance(node, RealTerm):
+            encoded.append(f"real:{type(node.value).__name__}:{node.value!r}")
+        elif isinstance(node, Index):
+            # not indices.index(node), Index.__eq__ builds an Equation
+            encoded.append(f"index:{next(k for k, idx in enumerate(indices) if idx is node)}")
+        elif isinstance(node, CompositeTerm):
+            encoded.append(f"{node.operator.name}:{left}:{right}")
+    return encoded
+
+
+def fingerprint(eq: Equation) -> str:
+    """Get a structural fingerprint of eq that is stable across processes, i.e.
+    equations built the same way (with indices of the same shape) get the same fingerprint.
+
+    Parameters
+    ----------
+    eq
+
+    Returns
+    -------
+        hex digest
+    """
+    parts = [
+        f"version:{CACHE_VERSION}",
+        f"shape:{eq.shape}",
+        f"operator:{eq.operator.name}",
+        "left", *term_fingerprint(eq.left, eq.indices),
+        "right", *term_fingerprint(eq.right, eq.indices),
+    ]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
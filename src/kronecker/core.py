@@ -1,13 +1,42 @@
 from __future__ import annotations
 import abc
+import threading
+import weakref
+from math import copysign
 from numbers import Real
-from typing import Sequence, Tuple, Dict, Any, Union, Optional, List
+from typing import Sequence, Tuple, Dict, Any, Union, Optional, List, Callable, TypeVar
 import operator as op
 
 from kronecker.primitives import ComparisonOperator, BinaryOperator
 
 
+T = TypeVar("T")
+
+# (term, position of left operand, position of right operand), -1 for leaves
+PostfixInstruction = Tuple["Term", int, int]
+
+# CompositeTerms are immutable, so identical ones are shared.
+# Keys are (operator, left, right). Operands are keyed by id, as Term.__eq__ builds Equations,
+# except for constant right operands, which are keyed by value (see composite_key),
+# so constants don't need to be interned themselves. Values are weak references, dead entries
+# are purged (in bulk, much cheaper than weakref callbacks) whenever the table has doubled in size.
+_INTERNED: Dict[Tuple[Any, ...], weakref.ReferenceType] = {}
+_PURGE_AT = 1024
+# guards inserting into and purging _INTERNED (lookups don't need it)
+_INTERN_LOCK = threading.Lock()
+
+# attribute access on Enum classes is slow, these are used for every node
+_ADD = BinaryOperator.ADD
+_SUB = BinaryOperator.SUB
+_MUL = BinaryOperator.MUL
+_POW = BinaryOperator.POW
+_FLOORDIV = BinaryOperator.FLOORDIV
+_TRUEDIV = BinaryOperator.TRUEDIV
+
+
 class Term(abc.ABC):
+    __slots__ = ("indices", "__weakref__")
+
     def __init__(self, indices: Sequence[Index]):
         self.indices: Tuple[Index, ...] = tuple(indices)
 
@@ -44,44 +73,55 @@ class Term(abc.ABC):
         return self.__comparison_op(other, ComparisonOperator.LE)
 
     def __binary_op(self, other: Any, operator: BinaryOperator) -> CompositeTerm:
-        if isinstance(other, Real):
-            return CompositeTerm(
-                self.indices, self, RealTerm(other, self.indices), operator
-            )
-        elif isinstance(other, Term):
-            return CompositeTerm(self.indices, self, other, operator)
-
-        return NotImplemented
+        # this runs for every node of every expression, so the common cases are kept cheap.
+        # isinstance with ABCs is comparatively slow: Term has no virtual subclasses,
+        # so skip ABCMeta.__instancecheck__, and check the common number types before Real.
+        # composite_key is inlined, constants are only created if needed
+        if type.__instancecheck__(Term, other):
+            if type(other) is RealTerm:
+                return intern_composite_term(self.indices, self, other, operator)
+            key: Tuple[Any, ...] = (id(operator), id(self), id(other))
+            is_constant = False
+        elif isinstance(other, (int, float)) or isinstance(other, Real):
+            key = (id(operator), id(self), type(other), other, copysign(1.0, other) if other == 0 else 1.0)
+            is_constant = True
+        else:
+            return NotImplemented
+        interned: Optional[CompositeTerm] = _INTERNED.get(key, _dead_ref)()
+        if interned is not None:
+            return interned
+        right = RealTerm(other, self.indices) if is_constant else other
+        return new_composite_term(key, self.indices, self, right, operator)
 
     def __add__(self, other: Any) -> CompositeTerm:
-        return self.__binary_op(other, BinaryOperator.ADD)
+        return self.__binary_op(other, _ADD)
 
     def __radd__(self, other: Any) -> CompositeTerm:
         return self + other
 
     def __sub__(self, other: Any) -> CompositeTerm:
-        return self.__binary_op(other, BinaryOperator.SUB)
+        return self.__binary_op(other, _SUB)
 
     def __rsub__(self, other: Any) -> CompositeTerm:
         return other + (-self)
 
     def __mul__(self, other: Any) -> CompositeTerm:
-        return self.__binary_op(other, BinaryOperator.MUL)
+        return self.__binary_op(other, _MUL)
 
     def __rmul__(self, other: Any) -> CompositeTerm:
         return self * other
 
     def __pow__(self, other: Any) -> CompositeTerm:
-        return self.__binary_op(other, BinaryOperator.POW)
+        return self.__binary_op(other, _POW)
 
     def __floordiv__(self, other: Any) -> CompositeTerm:
-        return self.__binary_op(other, BinaryOperator.FLOORDIV)
+        return self.__binary_op(other, _FLOORDIV)
 
     def __rfloordiv__(self, other: Any) -> CompositeTerm:
         return self // other
 
     def __truediv__(self, other: Any) -> CompositeTerm:
-        return self.__binary_op(other, BinaryOperator.TRUEDIV)
+        return self.__binary_op(other, _TRUEDIV)
 
     def __rtruediv__(self, other: Any) -> CompositeTerm:
         return self / other
@@ -91,12 +131,16 @@ class Term(abc.ABC):
 
 
 class RealTerm(Term):
+    __slots__ = ("value",)
+
     def __init__(self, value: Real, indices: Sequence[Index]):
-        super().__init__(indices)
+        self.indices = tuple(indices)
         self.value = value
 
 
 class Index(Term):
+    __slots__ = ("n",)
+
     def __init__(self, n: int):
         # indices are updated later, once they are all instantiated
         self.indices: Tuple[Index, ...] = (self,)
@@ -107,6 +151,22 @@ class Index(Term):
 
 
 class CompositeTerm(Term):
+    __slots__ = ("left", "right", "operator", "_postfix")
+    left: Term
+    right: Term
+    operator: BinaryOperator
+    # postfix program without the last entry (the term itself), and its operand positions
+    _postfix: Tuple[Tuple[PostfixInstruction, ...], int, int]
+
+    def __new__(
+        cls,
+        indices: Sequence[Index],
+        left: Term,
+        right: Term,
+        operator: BinaryOperator,
+        ) -> CompositeTerm:
+        return intern_composite_term(tuple(indices), left, right, operator)
+
     def __init__(
         self,
         indices: Sequence[Index],
@@ -114,10 +174,188 @@ class CompositeTerm(Term):
         right: Term,
         operator: BinaryOperator,
     ):
-        super().__init__(indices)
-        self.left = left
-        self.right = right
-        self.operator = operator
+        # initialised in intern_composite_term
+        pass
+
+    def __reduce__(self) -> Tuple[Callable[..., Term], Tuple[Tuple[Any, ...]]]:
+        # pickle the postfix program, pickling the nested terms recurses and fails for deep ones
+        return from_program, (to_program(self),)
+
+
+def _dead_ref() -> None:
+    # stands in for a missing entry, so lookups only need a single call
+    return None
+
+
+def purge_interned() -> None:
+    """Remove the entries of terms that don't exist anymore from the intern table.
+    Must be called with _INTERN_LOCK held.
+    """
+    global _PURGE_AT
+    for dead in [k for k, ref in _INTERNED.items() if ref() is None]:
+        del _INTERNED[dead]
+    _PURGE_AT = max(1024, 2 * len(_INTERNED))
+
+
+def composite_key(operator: BinaryOperator, left: Term, right: Term) -> Tuple[Any, ...]:
+    """Get the key of the CompositeTerm combining left and right with operator in the intern table."""
+    # Enum.__hash__ is implemented in python, members are singletons anyway
+    if isinstance(right, RealTerm):
+        value = right.value
+        # 1 == 1.0 == True and 0.0 == -0.0, but they give different results (e.g. 1 / -0.0)
+        return (id(operator), id(left), type(value), value, copysign(1.0, value) if value == 0 else 1.0)
+    return (id(operator), id(left), id(right))
+
+
+def intern_composite_term(
+    indices: Tuple[Index, ...],
+    left: Term,
+    right: Term,
+    operator: BinaryOperator
+    ) -> CompositeTerm:
+    """Get the CompositeTerm combining left and right with operator, creating it only if it doesn't exist yet."""
+    key = composite_key(operator, left, right)
+    interned: Optional[CompositeTerm] = _INTERNED.get(key, _dead_ref)()
+    if interned is not None:
+        return interned
+    return new_composite_term(key, indices, left, right, operator)
+
+
+def new_composite_term(
+    key: Tuple[Any, ...],
+    indices: Tuple[Index, ...],
+    left: Term,
+    right: Term,
+    operator: BinaryOperator
+    ) -> CompositeTerm:
+    """Create a CompositeTerm and add it to the intern table under key,
+    unless another thread has done so since the lookup.
+    """
+    # not "with", which is noticeably slower for something done for every new term
+    _INTERN_LOCK.acquire()
+    try:
+        interned: Optional[CompositeTerm] = _INTERNED.get(key, _dead_ref)()
+        if interned is not None:
+            return interned
+        term = object.__new__(CompositeTerm)
+        term.indices = indices
+        term.left = left
+        term.right = right
+        term.operator = operator
+        # _postfix is only set once to_postfix is called
+        _INTERNED[key] = weakref.ref(term)
+        if len(_INTERNED) > _PURGE_AT:
+            purge_interned()
+    finally:
+        _INTERN_LOCK.release()
+    return term
+
+
+def to_postfix(term: Term) -> Tuple[PostfixInstruction, ...]:
+    """Flatten the expression tree of term into postfix order, children before their parents.
+    Shared subtrees only appear once, operands are referred to by their position.
+    The result is cached on the term, as terms are immutable.
+
+    Parameters
+    ----------
+    term
+
+    Returns
+    -------
+        Tuple of (term, position of left operand, position of right operand),
+        positions are -1 for leaves. The last entry is term itself.
+    """
+    if not isinstance(term, CompositeTerm):
+        return ((term, -1, -1),)
+    postfix_cache = getattr(term, "_postfix", None)
+    if postfix_cache is not None:
+        operands, left, right = postfix_cache
+        return operands + ((term, left, right),)
+
+    positions: Dict[int, int] = {}
+    postfix: List[PostfixInstruction] = []
+    # iterative depth first traversal, so deep expressions don't hit the recursion limit
+    stack: List[Term] = [term]
+    while stack:
+        node = stack[-1]
+        if id(node) in positions:
+            stack.pop()
+        elif isinstance(node, CompositeTerm) and not (
+                id(node.left) in positions and id(node.right) in positions):
+            stack.extend(child for child in (node.right, node.left) if id(child) not in positions)
+        else:
+            stack.pop()
+            positions[id(node)] = len(postfix)
+            if isinstance(node, CompositeTerm):
+                postfix.append((node, positions[id(node.left)], positions[id(node.right)]))
+            else:
+                postfix.append((node, -1, -1))
+
+    # don't cache the last entry, a reference from term to itself would only be freed by the garbage collector
+    _, left, right = postfix.pop()
+    term._postfix = (tuple(postfix), left, right)
+    return term._postfix[0] + ((term, left, right),)
+
+
+def fold_term(
+    term: Term,
+    leaf: Callable[[Term], T],
+    combine: Callable[[CompositeTerm, T, T], T]
+    ) -> T:
+    """Evaluate term bottom up without recursion, each shared subtree only once.
+    Intermediate values are dropped as soon as they have been used for the last time.
+
+    Parameters
+    ----------
+    term
+    leaf
+        function giving the value of a RealTerm or Index
+    combine
+        function giving the value of a CompositeTerm from the values of its operands
+
+    Returns
+    -------
+        value of term
+    """
+    postfix = to_postfix(term)
+    last_use = list(range(len(postfix)))
+    for position, (_, left, right) in enumerate(postfix):
+        if left >= 0:
+            last_use[left] = last_use[right] = position
+
+    values: List[Optional[T]] = [None] * len(postfix)
+    for position, (node, left, right) in enumerate(postfix):
+        if left < 0:
+            values[position] = leaf(node)
+        else:
+            values[position] = combine(
+                node, values[left], values[right])  # type: ignore
+            if last_use[left] == position:
+                values[left] = None
+            if last_use[right] == position:
+                values[right] = None
+    return values[-1]  # type: ignore
+
+
+def to_program(term: Term) -> Tuple[Any, ...]:
+    """Get the postfix program of term as plain data, i.e. leaves are kept and
+    composite terms are replaced by (operator, position of left operand, position of right operand).
+    """
+    return tuple(
+        (node.operator, left, right) if isinstance(node, CompositeTerm) else node
+        for node, left, right in to_postfix(term))
+
+
+def from_program(program: Tuple[Any, ...]) -> Term:
+    """Build the term described by program (see to_program) without recursion."""
+    terms: List[Term] = []
+    for instruction in program:
+        if isinstance(instruction, tuple):
+            operator, left, right = instruction
+            terms.append(CompositeTerm(terms[left].indices, terms[left], terms[right], operator))
+        else:
+            terms.append(instruction)
+    return terms[-1]
 
 
 class Equation:
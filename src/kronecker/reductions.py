@@ -0,0 +1,286 @@
+from typing import Optional, Union, Tuple, Iterator
+
+import numpy as np
+
+from kronecker.core import Equation, Index
+from kronecker.primitives import ComparisonOperator
+from kronecker.backends.numpy import realise_term, realise_tile, iter_tiles, DEFAULT_TILE_SIZE
+from kronecker.backends.scipy_sparse import get_linear_form, NonLinearError
+
+
+LinearForm = Tuple[ComparisonOperator, float, float]
+Intervals = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def split_indices(eq: Equation, axis: int) -> Tuple[Index, Index]:
+    """Get (other index, index along axis) of the 2 dimensional equation eq."""
+    row_index, col_index = eq.indices
+    return (row_index, col_index) if axis == 1 else (col_index, row_index)
+
+
+def check_entries(
+    eq: Equation, axis: int, others: np.ndarray, values: np.ndarray,
+    operator: Optional[ComparisonOperator] = None
+    ) -> np.ndarray:
+    """Evaluate the 2 dimensional equation eq at the entries with index values along axis
+    and others along the other axis, exactly like NumpyBackend.realise does.
+    If operator is given it replaces the comparison operator of eq.
+    """
+    other_index, axis_index = split_indices(eq, axis)
+    index_values = {other_index: others, axis_index: values}
+    res = (operator or eq.operator).value(
+        realise_term(eq.left, index_values),
+        realise_term(eq.right, index_values))
+    return np.broadcast_to(res, others.shape)
+
+
+def linear_intervals(eq: Equation, axis: int, form: LinearForm, others: np.ndarray, n: int) -> Intervals:
+    """Get the True entries of the 2 dimensional equation eq along axis, for the given values
+    of the other index. eq has the form
+        index_along_axis {operator} {a} * other_index + {b}
+    For each of others the entries are True on [lo, hi), except for excluded (-1 if there is none).
+
+    a and b are floats, so the boundaries computed from them can be off by one.
+    They are corrected by evaluating eq at the neighbouring entries,
+    so the result always agrees with eq.to_numpy().
+
+    Parameters
+    ----------
+    eq
+    axis
+        axis to get the intervals along
+    form
+        tuple of (operator, a, b), see get_2d_linear_form
+    others
+        values of the other index
+    n
+        size of eq along axis
+
+    Returns
+    -------
+        Tuple of (lo, hi, excluded) arrays, one entry per value in others.
+    """
+    operator, a, b = form
+    x = a * others.astype(np.float64) + b
+    lo = np.zeros(len(others), dtype=np.int64)
+    hi = np.full(len(others), n, dtype=np.int64)
+    excluded = np.full(len(others), -1, dtype=np.int64)
+
+    if operator in (ComparisonOperator.EQ, ComparisonOperator.NE):
+        # the equation holds for at most one value, which is close to x
+        approx = np.clip(np.round(x), -1, n).astype(np.int64)
+        hit_value = np.full(len(others), -1, dtype=np.int64)
+        for candidate in (approx - 1, approx, approx + 1):
+            check = (hit_value < 0) & (candidate >= 0) & (candidate < n)
+            hit = np.zeros(len(others), dtype=bool)
+            hit[check] = check_entries(
+                eq, axis, others[check], candidate[check], ComparisonOperator.EQ)  # type: ignore
+            hit_value[hit] = candidate[hit]
+        if operator is ComparisonOperator.EQ:
+            lo = np.maximum(hit_value, 0)
+            hi = lo + (hit_value >= 0)
+        else:
+            excluded = hit_value
+    elif operator in (ComparisonOperator.GT, ComparisonOperator.GE):
+        approx = np.floor(x) + 1 if operator is ComparisonOperator.GT else np.ceil(x)
+        lo = correct_boundary(eq, axis, others, np.clip(approx, 0, n).astype(np.int64), n, upper=True)
+    elif operator in (ComparisonOperator.LT, ComparisonOperator.LE):
+        approx = np.ceil(x) if operator is ComparisonOperator.LT else np.floor(x) + 1
+        hi = correct_boundary(eq, axis, others, np.clip(approx, 0, n).astype(np.int64), n, upper=False)
+    else:
+        raise NotImplementedError(f"Operator {operator} is not supported!")
+    return lo, hi, excluded
+
+
+def correct_boundary(
+    eq: Equation, axis: int, others: np.ndarray,
+    boundary: np.ndarray, n: int, upper: bool
+    ) -> np.ndarray:
+    """Move the approximate boundaries between False and True entries along axis until they are exact.
+    If upper the entries are True from the boundary onwards, else up to (excluding) the boundary.
+    """
+    boundary = boundary.copy()
+    # entries just below / at the boundary should be False / True if upper, and vice versa
+    for step, offset in ((-1, -1), (1, 0)):
+        while True:
+            values = boundary + offset
+            check = (values >= 0) & (values < n)
+            wrong = np.zeros(len(others), dtype=bool)
+            wrong[check] = check_entries(eq, axis, others[check], values[check]) == (upper == (step < 0))
+            if not wrong.any():
+                break
+            boundary[wrong] += step
+    return boundary
+
+
+def iter_linear_counts(eq: Equation, axis: int, form: LinearForm) -> Iterator[np.ndarray]:
+    """Count the True entries of the 2 dimensional equation eq along axis, for each value
+    of the other index, in O(size of the other axis), without creating the matrix.
+
+    Parameters
+    ----------
+    eq
+    axis
+        axis to count along
+    form
+        tuple of (operator, a, b), see get_2d_linear_form
+
+    Returns
+    -------
+        Iterator over consecutive chunks of the counts.
+    """
+    n = eq.shape[axis]
+    n_others = eq.shape[1 - axis]
+    for start in range(0, n_others, DEFAULT_TILE_SIZE):
+        lo, hi, excluded = linear_intervals(
+            eq, axis, form, np.arange(start, min(start + DEFAULT_TILE_SIZE, n_others)), n)
+        yield hi - lo - ((excluded >= lo) & (excluded < hi))
+
+
+def get_2d_linear_form(eq: Equation, axis: int) -> Optional[LinearForm]:
+    """Get the linear form of the 2 dimensional equation eq, solved for the index
+    along axis. Returns None if there is none, i.e. we can't take the fast path.
+    """
+    if len(eq.shape) != 2:
+        return None
+    other_index, axis_index = split_indices(eq, axis)
+    try:
+        return get_linear_form(eq, other_index, axis_index)
+    except NonLinearError:
+        return None
+
+
+def get_any_2d_linear_form(eq: Equation) -> Optional[Tuple[int, LinearForm]]:
+    """Get (axis, linear form of eq solved for the index along axis) for the first axis that has one."""
+    for axis in (1, 0):
+        form = get_2d_linear_form(eq, axis)
+        if form is not None:
+            return axis, form
+    return None
+
+
+def normalise_axis(eq: Equation, axis: int) -> int:
+    if not -len(eq.shape) <= axis < len(eq.shape):
+        raise ValueError(f"axis {axis} is out of bounds for equation of dimension {len(eq.shape)}")
+    return axis % len(eq.shape)
+
+
+def reduce_sum(eq: Equation, axis: Optional[int] = None) -> Union[int, np.ndarray]:
+    """Count the True entries of the tensor represented by eq, without creating it.
+    For linear 2 dimensional equations this is O(rows) (or O(cols) for axis=0),
+    otherwise the tensor is evaluated tile by tile.
+
+    Parameters
+    ----------
+    eq
+        equation to reduce
+    axis
+        axis to sum over, if None sum over all entries
+
+    Returns
+    -------
+        total count if axis is None, else integer array of counts
+        with axis removed from the shape
+    """
+    if axis is None:
+        linear = get_any_2d_linear_form(eq)
+        if linear is not None:
+            return int(sum(int(c.sum()) for c in iter_linear_counts(eq, *linear)))
+        return int(sum(np.count_nonzero(realise_tile(eq, tile)) for tile in iter_tiles(eq.shape)))
+
+    axis = normalise_axis(eq, axis)
+    form = get_2d_linear_form(eq, axis)
+    if form is not None:
+        return concatenate_counts(eq, axis, iter_linear_counts(eq, axis, form))
+
+    if axis == 0:
+        total = np.zeros(eq.shape[1:], dtype=np.int64)
+        for tile in iter_tiles(eq.shape):
+            total += np.count_nonzero(realise_tile(eq, tile), axis=0)
+        return total
+    return concatenate_counts(eq, axis, (
+        np.count_nonzero(realise_tile(eq, tile), axis=axis).astype(np.int64)
+        for tile in iter_tiles(eq.shape)))
+
+
+def concatenate_counts(eq: Equation, axis: int, chunks: Iterator[np.ndarray]) -> np.ndarray:
+    """Concatenate the chunks of counts along axis of eq, there are none if the other axes are empty."""
+    chunk_list = list(chunks)
+    if not chunk_list:
+        return np.zeros(eq.shape[:axis] + eq.shape[axis + 1:], dtype=np.int64)
+    return np.concatenate(chunk_list)
+
+
+def reduce_any(eq: Equation) -> bool:
+    """Check whether any entry of the tensor represented by eq is True, without creating it.
+    Stops at the first tile (or chunk of rows / columns for linear 2 dimensional equations) containing one.
+    """
+    linear = get_any_2d_linear_form(eq)
+    if linear is not None:
+        return any(c.any() for c in iter_linear_counts(eq, *linear))
+    return any(realise_tile(eq, tile).any() for tile in iter_tiles(eq.shape))
+
+
+def reduce_all(eq: Equation) -> bool:
+    """Check whether all entries of the tensor represented by eq are True, without creating it.
+    Stops at the first tile (or chunk of rows / columns for linear 2 dimensional equations) containing a False one.
+    """
+    linear = get_any_2d_linear_form(eq)
+    if linear is not None:
+        axis, _ = linear
+        return all((c == eq.shape[axis]).all() for c in iter_linear_counts(eq, *linear))
+    return all(realise_tile(eq, tile).all() for tile in iter_tiles(eq.shape))
+
+
+def iter_nonzero(eq: Equation, chunk_size: int = DEFAULT_TILE_SIZE) -> Iterator[Tuple[np.ndarray, ...]]:
+    """Stream the coordinates of the True entries of the tensor represented by eq,
+    in row-major order, without creating it.
+    For linear 2 dimensional equations the coordinates are computed directly from
+    the True interval in each row, otherwise the tensor is evaluated tile by tile.
+
+    Parameters
+    ----------
+    eq
+        equation to get coordinates for
+    chunk_size
+        maximum number of coordinates per chunk for linear 2 dimensional equations
+        (a single row can exceed it), else maximum number of entries evaluated per chunk
+
+    Returns
+    -------
+        Iterator over chunks, each a tuple of n_dim coordinate arrays (as in np.nonzero).
+        Empty chunks are skipped.
+    """
+    form = get_2d_linear_form(eq, 1)
+    if form is None:
+        for tile in iter_tiles(eq.shape, chunk_size):
+            coords = np.nonzero(realise_tile(eq, tile))
+            if len(coords[0]):
+                yield (coords[0] + tile.start,) + coords[1:]
+        return
+
+    rows, cols = eq.shape
+    for start in range(0, rows, DEFAULT_TILE_SIZE):
+        block = np.arange(start, min(start + DEFAULT_TILE_SIZE, rows))
+        lo, hi, excluded = linear_intervals(eq, 1, form, block, cols)
+        counts = np.maximum(hi - lo, 0)
+        ends = np.cumsum(counts)
+        # split the block into chunks of at most chunk_size coordinates (but at least one row)
+        chunk_start = 0
+        while chunk_start < len(block):
+            done = ends[chunk_start - 1] if chunk_start > 0 else 0
+            chunk_end = max(chunk_start + 1, int(np.searchsorted(ends, done + chunk_size, side="right")))
+            chunk = slice(chunk_start, chunk_end)
+            chunk_start = chunk_end
+
+            total = int(ends[chunk.stop - 1] - done)
+            if total == 0:
+                continue
+            # expand each interval [lo, hi) into its column indices
+            chunk_counts = counts[chunk]
+            offsets = np.repeat(np.cumsum(chunk_counts) - chunk_counts - lo[chunk], chunk_counts)
+            row_coords = np.repeat(block[chunk], chunk_counts)
+            col_coords = np.arange(total) - offsets
+            keep = col_coords != np.repeat(excluded[chunk], chunk_counts)
+            if keep.any():
+                yield row_coords[keep], col_coords[keep]
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import pytest
+
+import kronecker
+import kronecker.backends.numpy as numpy_backend
+import kronecker.backends.scipy_sparse as scipy_sparse_backend
+from kronecker.cache import fingerprint
+
+
+@pytest.fixture
+def disk_cache(tmp_path):
+    cache = kronecker.enable_cache(tmp_path, max_bytes=10_000)
+    yield cache
+    kronecker.disable_cache()
+
+
+def fail(*args, **kwargs):
+    raise AssertionError("should have been loaded from the cache")
+
+
+def test_fingerprint_is_structural():
+    i, j = kronecker.indices(4, 5)
+    k, l = kronecker.indices(4, 5)
+    assert fingerprint(i * 2 >= j + 1) == fingerprint(k * 2 >= l + 1)
+    assert fingerprint(i * 2 >= j + 1) != fingerprint(j * 2 >= i + 1)
+    assert fingerprint(i * 2 >= j + 1) != fingerprint(i * 2 > j + 1)
+    assert fingerprint(i * 2 >= j + 1) != fingerprint(i * 2.0 >= j + 1)
+    m, n = kronecker.indices(4, 6)
+    assert fingerprint(i * 2 >= j + 1) != fingerprint(m * 2 >= n + 1)
+
+
+def test_numpy_cache_hit(disk_cache, monkeypatch):
+    i, j = kronecker.indices(20, 30)
+    expected = (i * 2 >= j + 1).to_numpy()
+
+    monkeypatch.setattr(numpy_backend, "realise_term", fail)
+    k, l = kronecker.indices(20, 30)
+    res = (k * 2 >= l + 1).to_numpy()
+    assert isinstance(res, np.memmap)
+    np.testing.assert_array_equal(res, expected)
+
+    # copy on write, the cache is unchanged
+    res[:] = False
+    np.testing.assert_array_equal((k * 2 >= l + 1).to_numpy(), expected)
+
+
+@pytest.mark.parametrize("eq_str", ["i * 3 == j", "i > j + 100"])
+def test_sparse_cache_hit(disk_cache, monkeypatch, eq_str):
+    i, j = kronecker.indices(20, 30)
+    expected = eval(eq_str).to_sparse()
+
+    monkeypatch.setattr(scipy_sparse_backend, "get_build_fun", fail)
+    i, j = kronecker.indices(20, 30)
+    res = eval(eq_str).to_sparse()
+    np.testing.assert_array_equal(res.todense(), expected.todense())
+
+
+def test_lru_eviction(disk_cache):
+    i, j = kronecker.indices(40, 100)
+    # each entry is 4000 bytes + header
+    first = i == j
+    first.to_numpy()
+    (i < j).to_numpy()
+    os.utime(disk_cache.entry_path(first, "numpy"), (0, 0))
+    os.utime(disk_cache.entry_path(i < j, "numpy"), (1, 1))
+    # a hit marks first as recently used
+    first.to_numpy()
+    (i > j).to_numpy()
+
+    assert os.path.exists(disk_cache.entry_path(first, "numpy"))
+    assert not os.path.exists(disk_cache.entry_path(i < j, "numpy"))
+    assert os.path.exists(disk_cache.entry_path(i > j, "numpy"))
+    assert sum(size for _, size, _ in disk_cache.entries()) <= disk_cache.max_bytes
+
+
+def test_corrupted_entry_is_a_miss(disk_cache):
+    i, j = kronecker.indices(20, 30)
+    expected = (i == j).to_numpy()
+    with open(os.path.join(disk_cache.entry_path(i == j, "numpy"), "array.npy"), "wb") as f:
+        f.write(b"not an array")
+
+    np.testing.assert_array_equal((i == j).to_numpy(), expected)
+    # the entry has been stored again
+    np.testing.assert_array_equal(disk_cache.load(i == j, "numpy", ("array",))["array"], expected)
+
+
+def test_inaccessible_entry_is_a_miss(disk_cache, monkeypatch):
+    i, j = kronecker.indices(20, 30)
+    expected = (i == j).to_numpy()
+
+    def no_permission(*args, **kwargs):
+        raise PermissionError()
+    monkeypatch.setattr(os, "utime", no_permission)
+    res = (i == j).to_numpy()
+    assert not isinstance(res, np.memmap)
+    np.testing.assert_array_equal(res, expected)
+
+
+def test_entry_bigger_than_cache_is_not_stored(disk_cache):
+    i, j = kronecker.indices(40, 100)
+    (i == j).to_numpy()
+    # 20000 bytes, more than max_bytes
+    k, l = kronecker.indices(200, 100)
+    (k == l).to_numpy()
+
+    assert not os.path.exists(disk_cache.entry_path(k == l, "numpy"))
+    assert os.path.exists(disk_cache.entry_path(i == j, "numpy"))
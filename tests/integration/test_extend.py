@@ -0,0 +1,61 @@
+import numpy as np
+import scipy.sparse as sparse
+import pytest
+
+import kronecker
+
+
+@pytest.mark.parametrize("eq_str", [
+    "i == j",
+    "i * 5 - 6 + j * 2 - 3 * i == 8 * j",
+    "j / 5 > i / 13",
+    "j / 5 >= i / 13",
+    "j / 5 < i / 13",
+    "j / 5 <= i / 13",
+    "i != j * 2",
+    "i != j - 30",
+    "i >= 7",
+    "i == j ** 2",
+    "i // 3 + j * i == 8 * j",
+])
+@pytest.mark.parametrize("new_shape", [(30, 20), (45, 20), (30, 33), (45, 33)])
+def test_extend_against_full(eq_str, new_shape):
+    i, j = kronecker.indices(30, 20)
+    eq = eval(eq_str)
+    i_full, j_full = kronecker.indices(*new_shape)
+    expected = eval(eq_str.replace("i", "i_full").replace("j", "j_full")).to_numpy()
+
+    res_numpy = eq.extend(eq.to_numpy(), *new_shape)
+    np.testing.assert_array_equal(res_numpy, expected)
+
+    res_sparse = eq.extend(eq.to_sparse(), *new_shape)
+    assert sparse.isspmatrix_csr(res_sparse)
+    assert res_sparse.has_sorted_indices
+    np.testing.assert_array_equal(res_sparse.todense(), expected)
+
+
+def test_extend_3d():
+    i, j, k = kronecker.indices(2, 3, 4)
+    eq = i >= j + k - 3
+    i_full, j_full, k_full = kronecker.indices(4, 3, 6)
+    expected = (i_full >= j_full + k_full - 3).to_numpy()
+    np.testing.assert_array_equal(eq.extend(eq.to_numpy(), 4, 3, 6), expected)
+
+
+def test_extend_repeatedly():
+    i, j = kronecker.indices(1000, 1000)
+    eq = i * 5 == j
+    res = eq.to_sparse()
+    for rows in range(1100, 1500, 100):
+        res = eq.extend(res, rows, 1000)
+    assert res.shape == (1400, 1000)
+    assert res.sum() == 200
+
+
+def test_extend_smaller_shape():
+    i, j = kronecker.indices(4, 4)
+    eq = i == j
+    with pytest.raises(ValueError):
+        eq.extend(eq.to_numpy(), 3, 4)
+    with pytest.raises(ValueError):
+        eq.extend(eq.to_sparse(), 4, 3)
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+import kronecker
+
+
+EQUATIONS_2D = [
+    "i == j",
+    "i * 5 - 6 + j * 2 - 3 * i == 8 * j",
+    "j / 5 > i / 13",
+    "j / 5 >= i / 13",
+    "j / 5 < i / 13",
+    "j / 5 <= i / 13",
+    "i != j * 2",
+    "i >= j * 2 - 1",
+    "i >= 7",
+    "i == j ** 2",
+    "i // 3 + j * i == 8 * j",
+    # 1 / 49 isn't exact as a float
+    "j * 49 == i",
+    "j * 49 != i",
+    "j * 49 <= i",
+    "j * 49 > i",
+    "i * 1.3 > j",
+]
+
+
+@pytest.mark.parametrize("eq_str", EQUATIONS_2D)
+@pytest.mark.parametrize("axis", [None, 0, 1, -1])
+def test_sum_against_numpy(eq_str, axis):
+    i, j = kronecker.indices(200, 23)
+    eq = eval(eq_str)
+    np.testing.assert_array_equal(eq.sum(axis=axis), eq.to_numpy().sum(axis=axis))
+
+
+@pytest.mark.parametrize("axis", [None, 0, 1, 2])
+def test_sum_3d(axis):
+    i, j, k = kronecker.indices(4, 5, 6)
+    eq = i >= j + k - 3
+    np.testing.assert_array_equal(eq.sum(axis=axis), eq.to_numpy().sum(axis=axis))
+
+
+@pytest.mark.parametrize("shape", [(0, 5), (5, 0), (0, 0)])
+@pytest.mark.parametrize("eq_str", ["i == j", "i * j == j", "i >= 0"])
+def test_empty_shapes(shape, eq_str):
+    i, j = kronecker.indices(*shape)
+    eq = eval(eq_str)
+    expected = eq.to_numpy()
+    for axis in [None, 0, 1]:
+        np.testing.assert_array_equal(eq.sum(axis=axis), expected.sum(axis=axis))
+    assert eq.any() == expected.any()
+    assert eq.all() == expected.all()
+    assert list(eq.nonzero()) == []
+
+
+@pytest.mark.parametrize("shape", [(0, 5, 6), (4, 0, 6)])
+@pytest.mark.parametrize("axis", [0, 1, 2])
+def test_empty_shapes_3d(shape, axis):
+    i, j, k = kronecker.indices(*shape)
+    eq = i >= j + k - 3
+    res = eq.sum(axis=axis)
+    expected = eq.to_numpy().sum(axis=axis)
+    assert res.shape == expected.shape
+    np.testing.assert_array_equal(res, expected)
+
+
+def test_sum_invalid_axis():
+    i, j = kronecker.indices(4, 4)
+    with pytest.raises(ValueError):
+        (i == j).sum(axis=2)
+
+
+@pytest.mark.parametrize("eq_str", EQUATIONS_2D + ["i > 100", "i < 100", "i - j < 100", "j > 100", "j < 100"])
+def test_any_all_against_numpy(eq_str):
+    i, j = kronecker.indices(200, 23)
+    eq = eval(eq_str)
+    assert eq.any() == eq.to_numpy().any()
+    assert eq.all() == eq.to_numpy().all()
+
+
+@pytest.mark.parametrize("eq_str", EQUATIONS_2D)
+def test_nonzero_against_numpy(eq_str):
+    i, j = kronecker.indices(200, 23)
+    eq = eval(eq_str)
+    chunks = list(eq.nonzero(chunk_size=50))
+    # linear chunks are limited by the number of coordinates (or a single row),
+    # non-linear ones by the number of entries evaluated
+    assert all(len(rows) <= 50 or len(np.unique(rows)) == 1 for rows, _ in chunks)
+    rows, cols = (np.concatenate(c) for c in zip(*chunks))
+    expected_rows, expected_cols = np.nonzero(eq.to_numpy())
+    np.testing.assert_array_equal(rows, expected_rows)
+    np.testing.assert_array_equal(cols, expected_cols)
+
+
+def test_nonzero_3d():
+    i, j, k = kronecker.indices(4, 5, 6)
+    eq = i >= j + k - 3
+    coords = tuple(np.concatenate(c) for c in zip(*eq.nonzero(chunk_size=30)))
+    for res, expected in zip(coords, np.nonzero(eq.to_numpy())):
+        np.testing.assert_array_equal(res, expected)
+
+
+def test_band_sum_without_materialisation():
+    # would run out of memory if created as a numpy array
+    i, j = kronecker.indices(1_000_000, 1_000_000)
+    eq = j - i <= 2
+    row_sums = eq.sum(axis=1)
+    assert row_sums[0] == 3
+    assert row_sums[-1] == 1_000_000
+    assert eq.sum() == row_sums.sum()
+    assert eq.any()
+    assert not eq.all()
+
+
+def test_nonzero_chunks_sized_by_output():
+    i, j = kronecker.indices(1_000_000, 1_000_000)
+    chunks = list((i == j).nonzero(chunk_size=300_000))
+    assert [len(rows) for rows, _ in chunks] == [300_000, 300_000, 300_000, 100_000]
+    np.testing.assert_array_equal(np.concatenate([cols for _, cols in chunks]), np.arange(1_000_000))
+
+
+def test_any_all_without_column_index():
+    i, j = kronecker.indices(1_000_000, 1_000_000)
+    assert not (i > 10 ** 6).any()
+    assert (i < 10 ** 6).all()
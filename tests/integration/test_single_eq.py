@@ -108,4 +108,30 @@ def test_rsub():
 
     res = (2 - i == j).to_numpy()
 
-    np.testing.assert_array_equal(res, expected)
\ No newline at end of file
+    np.testing.assert_array_equal(res, expected)
+
+
+@pytest.mark.parametrize("shape, eq_str", [
+    ((37, 23), "i * 4 // 5 - j >= 0"),
+    ((37, 23), "i ** 2 > j"),
+    ((5, 7, 11), "i >= j + k - 3"),
+    ((100,), "i // 3 * 3 == i"),
+])
+@pytest.mark.parametrize("threads", [2, 4, 64])
+def test_threads(shape, eq_str, threads):
+    i, j, k = (kronecker.indices(*shape) + (None, None))[:3]
+    eq = eval(eq_str)
+    np.testing.assert_array_equal(eq.to_numpy(threads=threads), eq.to_numpy(threads=1))
+
+
+def test_threads_global_default(monkeypatch):
+    monkeypatch.setattr(kronecker.backends.NumpyBackend, "threads", 4)
+    i, j = kronecker.indices(10, 10)
+    np.testing.assert_array_equal((i == j).to_numpy(), np.eye(10))
+
+
+@pytest.mark.parametrize("threads", [0, -1])
+def test_invalid_threads(threads):
+    i, j = kronecker.indices(4, 4)
+    with pytest.raises(ValueError):
+        (i == j).to_numpy(threads=threads)
@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+import gc
+import pickle
+import weakref
+
+import numpy as np
+import pytest
+
+import kronecker
+from kronecker.core import to_postfix, fold_term, RealTerm, CompositeTerm
+
+
+def test_identical_terms_are_shared():
+    i, j = kronecker.indices(3, 3)
+    assert (i * 2 + j) is (i * 2 + j)
+    assert (i * 2 + j) is not (j + i * 2)
+    assert (i * 1) is not (i * 1.0)
+    assert (i / 0.0) is not (i / -0.0)
+
+
+def test_signed_zero():
+    i, j = kronecker.indices(3, 3)
+    i / -0.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.testing.assert_array_equal((j <= i / 0.0).to_numpy()[1, :3], [True, True, True])
+        np.testing.assert_array_equal((j <= i / -0.0).to_numpy()[1, :3], [False, False, False])
+
+
+def test_terms_from_different_indices_are_not_shared():
+    i, j = kronecker.indices(3, 3)
+    k, l = kronecker.indices(3, 3)
+    assert (i + 1) is not (k + 1)
+
+
+def test_terms_have_no_dict():
+    i, j = kronecker.indices(3, 3)
+    for term in (i, i + 1, RealTerm(1, i.indices)):
+        assert not hasattr(term, "__dict__")
+
+
+def test_postfix_shares_subtrees():
+    i, j = kronecker.indices(3, 3)
+    a = i * 2 + j
+    postfix = to_postfix(a * a)
+    assert len(postfix) == 6
+    assert postfix[-1][0] is a * a
+    for position, (term, left, right) in enumerate(postfix):
+        if isinstance(term, CompositeTerm):
+            assert postfix[left][0] is term.left
+            assert postfix[right][0] is term.right
+            assert left < position and right < position
+        else:
+            assert left == right == -1
+
+
+def test_postfix_cache_has_no_cycle():
+    i, j = kronecker.indices(3, 3)
+    eq = i * 3 + 1 == j
+    gc.disable()
+    try:
+        eq.to_numpy()
+        assert to_postfix(eq.left)[-1][0] is eq.left
+        left = weakref.ref(eq.left)
+        del eq
+        assert left() is None
+    finally:
+        gc.enable()
+
+
+def test_concurrent_building():
+    i, j = kronecker.indices(3, 3)
+
+    def build(start):
+        term = i
+        for n in range(start, start + 3000):
+            term = term * n + (n % 13)
+        # also builds terms shared with the other threads
+        return term + j * 2 + 1
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(build, [0] * 4 + [5000] * 4))
+    # identical terms are shared across threads
+    assert all(res is results[0] for res in results[:4])
+    assert all(res is results[4] for res in results[4:])
+
+
+def test_fold_term():
+    i, j = kronecker.indices(3, 3)
+    count = fold_term(
+        (i + 1) * (i + 1) - j,
+        lambda term: 1,
+        lambda term, left, right: left + right + 1)
+    # tree size, not dag size
+    assert count == 9
+
+
+def test_deep_expression():
+    i, j = kronecker.indices(5, 5)
+    term = i
+    for _ in range(10000):
+        term = term + 1
+    eq = term - 10000 == j
+    np.testing.assert_array_equal(eq.to_numpy(), np.eye(5))
+    np.testing.assert_array_equal(eq.to_sparse().todense(), np.eye(5))
+
+
+@pytest.mark.filterwarnings("ignore:Using slow path")
+def test_deep_non_linear_expression():
+    i, j = kronecker.indices(5, 5)
+    term = i
+    for _ in range(5000):
+        term = term + 1
+    eq = term // 1 - 5000 == j
+    np.testing.assert_array_equal(eq.to_numpy(), np.eye(5))
+    np.testing.assert_array_equal(eq.to_sparse().todense(), np.eye(5))
+
+
+def test_pickle():
+    i, j = kronecker.indices(4, 4)
+    eq = i * 2 - 1 <= j
+    np.testing.assert_array_equal(pickle.loads(pickle.dumps(eq)).to_numpy(), eq.to_numpy())
+
+
+def test_pickle_deep_expression():
+    i, j = kronecker.indices(5, 5)
+    term = i
+    for _ in range(10000):
+        term = term * 1 + 1
+    eq = term - 10000 == j
+    np.testing.assert_array_equal(pickle.loads(pickle.dumps(eq)).to_numpy(), np.eye(5))